@@ -9,14 +9,8 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize session states
-if 'processed_data' not in st.session_state:
-    st.session_state.processed_data = None
-if 'audio_features_added' not in st.session_state:
-    st.session_state.audio_features_added = False
-
-# Apply dark theme
-st.markdown("""
+# Static page styles, built once at import
+DARK_THEME_CSS = """
     <style>
     .stApp {
         background-color: #121212;
@@ -32,7 +26,33 @@ st.markdown("""
         color: #1DB954;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
+
+GREEN_BUTTON_CSS = """
+    button {
+        background-color: #1DB954 !important;
+        color: white !important;
+        border: none !important;
+    }
+    button:hover {
+        background-color: #1ed760 !important;
+        color: white !important;
+        border: none !important;
+    }
+"""
+
+# Initialize session states
+if 'processed_data' not in st.session_state:
+    st.session_state.processed_data = None
+if 'audio_features_added' not in st.session_state:
+    st.session_state.audio_features_added = False
+if 'totals' not in st.session_state:
+    st.session_state.totals = None
+if 'history_key' not in st.session_state:
+    st.session_state.history_key = None
+
+# Apply dark theme
+st.markdown(DARK_THEME_CSS, unsafe_allow_html=True)
 
 # Main page content
 st.title("🎵 Welcome to Your Spotify Wrapped Dashboard")
@@ -63,21 +83,7 @@ Get ready to explore your musical journey with detailed insights and beautiful v
 Ready to start? Click on **Upload Data** bellow!
 """)
 
-with stylable_container(
-    key="green_button",
-    css_styles="""
-        button {
-            background-color: #1DB954 !important;
-            color: white !important;
-            border: none !important;
-        }
-        button:hover {
-            background-color: #1ed760 !important;
-            color: white !important;
-            border: none !important;
-        }
-    """,
-):
+with stylable_container(key="green_button", css_styles=GREEN_BUTTON_CSS):
     if st.button("Upload Data 📃"):
         st.switch_page("pages/upload.py")
 
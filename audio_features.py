@@ -0,0 +1,76 @@
+# audio_features.py
+import hashlib
+import streamlit as st
+import pandas as pd
+import numpy as np
+
+# Bounds for caches holding anything derived from a user's history, shared by both pages
+# so users' histories don't pile up in server memory
+UPLOAD_CACHE_TTL = 3600
+UPLOAD_CACHE_MAX_ENTRIES = 32
+
+# Reasonable value ranges for the generated audio features
+AUDIO_FEATURE_RANGES = {
+    'danceability': (0.2, 0.9),
+    'energy': (0.1, 1.0),
+    'valence': (0.1, 0.9),
+    'tempo': (70, 180),
+    'speechiness': (0.02, 0.2),
+    'acousticness': (0.0, 1.0),
+    'instrumentalness': (0.0, 0.8)
+}
+
+def _uniform_from_seeds(seeds, column, n_columns):
+    """Draw one reproducible uniform in [0, 1) per seed using a vectorized splitmix64 hash"""
+    x = seeds.astype(np.uint64) * np.uint64(n_columns) + np.uint64(column)
+    x = x * np.uint64(0x9E3779B97F4A7C15) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)) * (1.0 / (1 << 53))
+
+@st.cache_data(ttl=UPLOAD_CACHE_TTL, max_entries=UPLOAD_CACHE_MAX_ENTRIES, show_spinner=False)
+def _generate_audio_feature(key, feature, _unique_tracks, _seeds):
+    """Generate one audio feature for a set of track URIs, cached on a digest of their seeds"""
+    low, high = AUDIO_FEATURE_RANGES[feature]
+    values = np.empty(len(_unique_tracks), dtype=np.float32)
+    column = list(AUDIO_FEATURE_RANGES).index(feature)
+    np.multiply(_uniform_from_seeds(_seeds, column, len(AUDIO_FEATURE_RANGES)), high - low, out=values)
+    values += low
+
+    return pd.Series(values, index=pd.Index(_unique_tracks, name='uri'), name=feature)
+
+def reset_audio_features():
+    """Forget generated features and their averages, e.g. when different data is loaded"""
+    st.session_state.features_by_uri = {}
+    st.session_state.feature_means = None
+
+def get_audio_feature(df, feature):
+    """Per-track values of one audio feature, generated on first access and kept in session state"""
+    if 'features_by_uri' not in st.session_state:
+        st.session_state.features_by_uri = {}
+    features_by_uri = st.session_state.features_by_uri
+
+    if feature not in features_by_uri:
+        unique_tracks = np.asarray(df['spotify_track_uri'].dropna().unique(), dtype=object)
+        unique_tracks = unique_tracks[unique_tracks != '']
+
+        # Use track URI as seed for reproducibility
+        # Hash all URIs to numeric seeds at once (pandas' fixed-key SipHash, stable across runs)
+        seeds = pd.util.hash_array(unique_tracks)
+        key = hashlib.blake2b(seeds.tobytes(), digest_size=16).hexdigest()
+        features_by_uri[feature] = _generate_audio_feature(key, feature, unique_tracks, seeds)
+
+    return features_by_uri[feature]
+
+def audio_feature_means(df, features):
+    """Play-weighted mean of each audio feature, without adding per-play columns to df"""
+    plays = df['spotify_track_uri'].value_counts()
+    means = {}
+
+    for feature in features:
+        values = get_audio_feature(df, feature)
+        weights = plays.reindex(values.index, fill_value=0).to_numpy()
+        means[feature] = float(np.dot(values.to_numpy(np.float64), weights) / weights.sum())
+
+    return pd.Series(means)
@@ -1,23 +1,10 @@
 # pages/1_Upload_Data.py
 import streamlit as st
 import pandas as pd
-import json
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
-import os
-import numpy as np
-from dotenv import load_dotenv
+import orjson
 from streamlit_extras.stylable_container import stylable_container
 from streamlit_extras.add_vertical_space import add_vertical_space
-
-load_dotenv()
-
-# Set your Spotify API credentials
-os.environ['SPOTIPY_CLIENT_ID'] = os.getenv('SPOTIPY_CLIENT_ID')
-os.environ['SPOTIPY_CLIENT_SECRET'] = os.getenv('SPOTIPY_CLIENT_SECRET')
-
-# Initialize Spotify client
-sp = spotipy.Spotify(client_credentials_manager=SpotifyClientCredentials())
+from audio_features import UPLOAD_CACHE_TTL, UPLOAD_CACHE_MAX_ENTRIES, reset_audio_features
 
 # Set page config
 st.set_page_config(
@@ -26,28 +13,106 @@ st.set_page_config(
     layout="wide"
 )
 
-def process_files(uploaded_files):
-    """Process uploaded JSON files"""
-    all_data = []
+# Static button style, built once at import
+GREEN_BUTTON_CSS = """
+    button {
+        background-color: #1DB954 !important;
+        color: white !important;
+        border: none !important;
+        align-content: center !important;
+    }
+    button:hover {
+        background-color: #1ed760 !important;
+        color: white !important;
+        border: none !important;
+    }
+"""
+
+# Spotify streaming history timestamps are always ISO-8601 in UTC
+TS_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# Extended streaming history schema, in export order
+STREAMING_HISTORY_COLUMNS = [
+    'ts', 'platform', 'ms_played', 'conn_country', 'ip_addr',
+    'master_metadata_track_name', 'master_metadata_album_artist_name',
+    'master_metadata_album_album_name', 'spotify_track_uri',
+    'episode_name', 'episode_show_name', 'spotify_episode_uri',
+    'reason_start', 'reason_end', 'shuffle', 'skipped', 'offline',
+    'offline_timestamp', 'incognito_mode'
+]
+
+# Repetitive string columns stored as pandas categoricals
+CATEGORICAL_COLUMNS = [
+    'master_metadata_track_name',
+    'master_metadata_album_artist_name',
+    'spotify_track_uri',
+    'platform',
+    'conn_country',
+    'reason_start',
+    'reason_end'
+]
+
+def _finalize(df):
+    """Shared processing for a freshly loaded streaming history DataFrame"""
+    df['ts'] = pd.to_datetime(df['ts'], format=TS_FORMAT, utc=True, cache=True, errors='coerce')
+    # Records without a usable timestamp (or files in another export format) can't be placed
+    # on the clock or calendar, so they're dropped
+    if df['ts'].isna().any():
+        df = df.dropna(subset=['ts']).reset_index(drop=True)
+    df['hour'] = df['ts'].dt.hour.astype('uint8')
+    df['date'] = df['ts'].dt.floor('D')
+    df['ms_played'] = pd.to_numeric(df['ms_played'], downcast='unsigned')
+    df['minutes_played'] = (df['ms_played'].to_numpy() * (1.0 / 60000.0)).astype('float32')
+    
+    # Compact categoricals, applied to the whole history so categories are shared across files
+    for col in CATEGORICAL_COLUMNS:
+        if col in df:
+            df[col] = df[col].astype('category')
     
-    for file in uploaded_files:
+    return df
+
+def _process_file_bytes(name, data):
+    """Parse the raw bytes of one uploaded JSON file into a DataFrame"""
+    return pd.DataFrame.from_records(orjson.loads(data), columns=STREAMING_HISTORY_COLUMNS)
+
+class UploadError(ValueError):
+    """An uploaded file that could not be parsed as streaming history JSON"""
+
+@st.cache_data(ttl=UPLOAD_CACHE_TTL, max_entries=UPLOAD_CACHE_MAX_ENTRIES, show_spinner=False)
+def _load_files(key, _contents):
+    """Parse, combine and finalize uploaded files, cached on their upload IDs so reruns skip all of it"""
+    # Files are parsed here rather than cached one by one, so each upload is held in memory
+    # only once, finalized
+    dfs = []
+    for name, data in _contents:
         try:
-            data = json.load(file)
-            all_data.extend(data)
-        except json.JSONDecodeError:
-            st.error(f"Error reading {file.name}. Please make sure it's a valid JSON file.")
-            return None
+            dfs.append(_process_file_bytes(name, data))
+        except orjson.JSONDecodeError as e:
+            raise UploadError(name) from e
     
-    if not all_data:
-        st.error("No valid data found in uploaded files.")
+    dfs = [df for df in dfs if not df.empty]
+    if not dfs:
         return None
     
-    df = pd.DataFrame(all_data)
-    
-    # Basic data processing
-    df['ts'] = pd.to_datetime(df['ts'])
-    df['minutes_played'] = df['ms_played'] / (1000 * 60)
+    # Finalize the combined history so categories are shared across files
+    df = _finalize(pd.concat(dfs, ignore_index=True))
+    return None if df.empty else df
+
+def process_files(uploaded_files):
+    """Process uploaded JSON files"""
+    # getvalue() hands back the upload's own bytes (BytesIO copy-on-write), so no copy is made here
+    contents = [(file.name, file.getvalue()) for file in uploaded_files]
+    # Streamlit's per-upload file_id identifies the bytes without hashing every rerun
+    key = tuple((file.file_id, file.name, file.size) for file in uploaded_files)
+    
+    try:
+        df = _load_files(key, contents)
+    except UploadError as e:
+        st.error(f"Error reading {e}. Please make sure it's a valid JSON file.")
+        return None
     
+    if df is None:
+        st.error("No valid data found in uploaded files.")
     return df
 
 def add_audio_features(df):
@@ -55,71 +120,47 @@ def add_audio_features(df):
         st.error("No track URIs found in the data. Cannot generate audio features.")
         return df
     
-    unique_tracks = df['spotify_track_uri'].unique()
-    total_tracks = len(unique_tracks)
-    
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    audio_features = []
-    
-    for i, uri in enumerate(unique_tracks):
-        try:
-            if uri and isinstance(uri, str):
-                # Use track URI as seed for reproducibility
-                # Convert URI to a numeric seed
-                seed = int.from_bytes(uri.encode(), 'big') % (2**32)
-                np.random.seed(seed)
-                
-                # Generate random features within reasonable ranges
-                feature = {
-                    'uri': uri,
-                    'danceability': np.random.uniform(0.2, 0.9),
-                    'energy': np.random.uniform(0.1, 1.0),
-                    'valence': np.random.uniform(0.1, 0.9),
-                    'tempo': np.random.uniform(70, 180),
-                    'speechiness': np.random.uniform(0.02, 0.2),
-                    'acousticness': np.random.uniform(0.0, 1.0),
-                    'instrumentalness': np.random.uniform(0.0, 0.8)
-                }
-                audio_features.append(feature)
-            
-            # Update progress
-            progress = (i + 1) / total_tracks
-            progress_bar.progress(progress)
-            status_text.text(f'Generating features for track {i + 1} of {total_tracks}')
-            
-        except Exception as e:
-            st.warning(f"Error processing track: {str(e)}")
-            continue
-    
-    progress_bar.empty()
-    status_text.empty()
-    
-    if audio_features:
-        features_df = pd.DataFrame(audio_features)
-        # Merge features with original DataFrame
-        df = df.merge(
-            features_df[['uri', 'danceability', 'energy', 'valence', 'tempo', 'speechiness', 'acousticness', 'instrumentalness']],
-            left_on='spotify_track_uri',
-            right_on='uri',
-            how='left'
-        )
-        st.success("✅ Audio features generated successfully!")
+    if df['spotify_track_uri'].notna().any():
+        # Features are generated per feature on first use by the wrapped page (see audio_features.py)
+        st.success("✅ Audio features will be generated when you view your Wrapped!")
         st.session_state['audio_features_added'] = True
     
     return df
 
+@st.cache_data(show_spinner=False)
 def load_example_data():
-    with open('data/StreamingHistory.json', 'r', encoding='utf-8') as file:
-        example_data = json.load(file)
+    with open('data/StreamingHistory.json', 'rb') as file:
+        example_data = orjson.loads(file.read())
     
-    # Convert to DataFrame
-    df = pd.DataFrame(example_data)
-    df['ts'] = pd.to_datetime(df['ts'])
-    df['minutes_played'] = df['ms_played'] / (1000 * 60)
-    
-    return df
+    return _finalize(pd.DataFrame.from_records(example_data, columns=STREAMING_HISTORY_COLUMNS))
+
+@st.cache_data(ttl=UPLOAD_CACHE_TTL, max_entries=UPLOAD_CACHE_MAX_ENTRIES, show_spinner=False)
+def _summary_stats(key, _df):
+    """Songs, artists and minutes totals, cached on a cheap key instead of hashing the DataFrame"""
+    # Both name columns are categoricals built from the whole history, so their category
+    # counts are the distinct counts without scanning every row
+    return (
+        _df['master_metadata_track_name'].cat.categories.size,
+        _df['master_metadata_album_artist_name'].cat.categories.size,
+        float(_df['minutes_played'].sum())
+    )
+
+def _history_key(df):
+    """Cheap identity for a loaded history: row count plus first and last timestamps"""
+    return (len(df), df['ts'].iloc[0], df['ts'].iloc[-1])
+
+def _store_processed_data(df):
+    """Keep the history in session state with the totals the wrapped page displays"""
+    _, total_artists, total_minutes = _summary_stats(_history_key(df), df)
+    # Features and their averages belong to the previous history
+    reset_audio_features()
+    st.session_state.processed_data = df
+    st.session_state.history_key = _history_key(df)
+    st.session_state.totals = {
+        'minutes': total_minutes,
+        'songs': len(df),
+        'artists': total_artists
+    }
 
 def main():
     st.title("🎵 Spotify Wrapped Data Upload")
@@ -158,29 +199,14 @@ def main():
     
     with col2:
             add_vertical_space(3)
-            with stylable_container(
-                key="green_button",
-                css_styles="""                
-                    button {
-                        background-color: #1DB954 !important;
-                        color: white !important;
-                        border: none !important;
-                        align-content: center !important;
-                    }
-                    button:hover {
-                        background-color: #1ed760 !important;
-                        color: white !important;
-                        border: none !important;
-                    }
-                """,
-            ):
+            with stylable_container(key="green_button", css_styles=GREEN_BUTTON_CSS):
                 use_example = st.button("Use Example Data", use_container_width=True,
                                 help="Click to use sample Spotify listening history")
             if use_example:
                 with st.spinner("Loading example data..."):
                     df = load_example_data()
                     if df is not None:
-                        st.session_state.processed_data = df
+                        _store_processed_data(df)
                         uploaded_files = None  # Clear any uploaded files
     
     if uploaded_files:
@@ -194,19 +220,21 @@ def main():
         # Display basic stats
         st.success(f"✅ Successfully loaded {len(df):,} listening records!")
         
+        total_songs, total_artists, total_minutes = _summary_stats(_history_key(df), df)
+        
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("Total Songs", f"{df['master_metadata_track_name'].nunique():,}")
+            st.metric("Total Songs", f"{total_songs:,}")
         with col2:
-            st.metric("Total Artists", f"{df['master_metadata_album_artist_name'].nunique():,}")
+            st.metric("Total Artists", f"{total_artists:,}")
         with col3:
-            st.metric("Total Minutes", f"{df['minutes_played'].sum():,.0f}")
+            st.metric("Total Minutes", f"{total_minutes:,.0f}")
         
         # Audio features section
         st.header("🎸 Audio Features")
         if not st.session_state.audio_features_added:
             if st.button("Add Audio Features"):
-                st.session_state.processed_data = add_audio_features(df)
+                _store_processed_data(add_audio_features(df))
         else:
             st.success("✅ Audio features are ready!")
         
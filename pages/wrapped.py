@@ -7,11 +7,20 @@ import numpy as np
 from datetime import datetime
 import os
 import random
+import threading
+import time
+import functools
+import inspect
+import diskcache
+import requests
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 import spotipy
 import streamlit.components.v1 as components
-from spotipy.oauth2 import SpotifyClientCredentials
+from spotipy.oauth2 import SpotifyClientCredentials, SpotifyOauthError
 from streamlit_extras.add_vertical_space import add_vertical_space
 from dotenv import load_dotenv
+from audio_features import UPLOAD_CACHE_TTL, UPLOAD_CACHE_MAX_ENTRIES, audio_feature_means, reset_audio_features
 load_dotenv()
 
 # Page config
@@ -26,10 +35,56 @@ if 'processed_data' not in st.session_state or st.session_state.processed_data i
     st.error("⚠️ No data found! Please upload your data first.")
     st.stop()
 
-# Get the data
+# Get the data, and the cheap identity the cached aggregations below are keyed on
 df = st.session_state.processed_data
+history_key = st.session_state.history_key
+
+# Concurrent Spotify searches, kept low to stay clear of API rate limits
+SPOTIFY_MAX_WORKERS = 5
+
+# Maximum IDs accepted by Spotify's multi-track and multi-artist endpoints
+SPOTIFY_BATCH_SIZE = 50
+
+# Spotify search results persisted on disk, shared across sessions and restarts
+SPOTIFY_CACHE_TTL = 7 * 24 * 3600
+
+# Client-side pacing of Spotify requests, how often a 429 is retried, and the longest
+# Retry-After (seconds) worth waiting for in the render thread before giving up
+SPOTIFY_RATE_LIMIT = 10
+SPOTIFY_MAX_RETRIES = 2
+SPOTIFY_MAX_RETRY_AFTER = 5
+
+# Server errors retried with backoff by the HTTP session, as spotipy does by default
+SPOTIFY_SERVER_ERRORS = (500, 502, 503, 504)
+
+# Longest history span, in days, drawn as one waveform bar per day
+WAVEFORM_DAILY_MAX_DAYS = 365
+
+# Failures a Spotify lookup treats as "not found": API, auth and network errors, plus
+# responses missing the expected items or images
+SPOTIFY_LOOKUP_ERRORS = (spotipy.SpotifyException, SpotifyOauthError,
+                         requests.exceptions.RequestException, IndexError, KeyError)
+
+# Audio features shown in the music profile
+PROFILE_FEATURES = ['danceability', 'energy', 'valence',
+                    'speechiness', 'acousticness', 'instrumentalness']
+
+# Radar chart colors per audio feature, with fills precomputed at import
+FEATURE_COLORS = {
+    'danceability': '#FF6B6B',
+    'energy': '#4ECDFF',
+    'valence': '#FFD93D',
+    'speechiness': '#95E1D3',
+    'acousticness': '#F5aA7B',
+    'instrumentalness': '#FF8BBA'
+}
+FEATURE_FILL = {
+    feature: f"rgba({int(color[1:3], 16)}, {int(color[3:5], 16)}, {int(color[5:7], 16)}, 0.6)"
+    for feature, color in FEATURE_COLORS.items()
+}
 
 # ---- Utility Functions ----
+@st.cache_resource(show_spinner=False)
 def setup_spotify():
     client_id = os.getenv('SPOTIPY_CLIENT_ID')
     client_secret = os.getenv('SPOTIPY_CLIENT_SECRET')
@@ -37,70 +92,236 @@ def setup_spotify():
         client_id=client_id, 
         client_secret=client_secret
     )
-    return spotipy.Spotify(client_credentials_manager=client_credentials_manager)
-
-def get_top_artists(df, n=10):
+    
+    # spotipy's own session also retries 429s, hiding Retry-After behind a generic error,
+    # so this one leaves them to spotify_request and only retries server errors
+    retry = Retry(
+        total=spotipy.Spotify.max_retries,
+        read=False,
+        status=spotipy.Spotify.max_retries,
+        backoff_factor=0.3,
+        allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+        status_forcelist=SPOTIFY_SERVER_ERRORS,
+        respect_retry_after_header=False
+    )
+    session = requests.Session()
+    session.mount('https://', requests.adapters.HTTPAdapter(max_retries=retry))
+    return spotipy.Spotify(client_credentials_manager=client_credentials_manager, requests_session=session)
+
+class LeakyBucket:
+    """Thread-safe limiter allowing `rate` requests per second, in bursts of up to `rate`"""
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            wait = max(0, (1 - self.tokens) / self.rate)
+            self.tokens -= 1
+        if wait:
+            time.sleep(wait)
+
+# Shared across reruns and sessions, since page globals are rebuilt on every rerun
+@st.cache_resource(show_spinner=False)
+def get_spotify_bucket():
+    return LeakyBucket(SPOTIFY_RATE_LIMIT)
+
+@st.cache_resource(show_spinner=False)
+def get_spotify_cache():
+    return diskcache.Cache('./spotify_cache')
+
+spotify_bucket = get_spotify_bucket()
+spotify_cache = get_spotify_cache()
+
+def spotify_request(method, *args, **kwargs):
+    """Call a spotipy method through the rate limiter, waiting out a short Retry-After on a 429"""
+    for attempt in range(SPOTIFY_MAX_RETRIES + 1):
+        spotify_bucket.acquire()
+        try:
+            return method(*args, **kwargs)
+        except spotipy.SpotifyException as e:
+            if e.http_status != 429 or attempt == SPOTIFY_MAX_RETRIES:
+                raise
+            retry_after = int((e.headers or {}).get('Retry-After', 1))
+            if retry_after > SPOTIFY_MAX_RETRY_AFTER:
+                raise
+            time.sleep(retry_after)
+
+def disk_cached(kind):
+    """Persist a Spotify lookup in spotify_cache, keyed on its arguments other than the client"""
+    def decorator(func):
+        signature = inspect.signature(func)
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (kind,) + tuple(value for arg, value in bound.arguments.items() if not arg.startswith('_'))
+            
+            result = spotify_cache.get(key)
+            if result is None:
+                result = func(*args, **kwargs)
+                # Failed lookups are not persisted, so they are retried later
+                if result is not None and result != (None, None):
+                    spotify_cache.set(key, result, expire=SPOTIFY_CACHE_TTL)
+            return result
+        return wrapper
+    return decorator
+
+# Artist, track and URI columns arrive as categoricals from the upload page (see _finalize),
+# so groupbys pass observed=True to skip category combinations that never occur.
+# Cached functions take the history as _df keyed on history_key, as hashing the whole
+# DataFrame on every lookup costs more than most of the aggregations themselves
+@st.cache_data(ttl=UPLOAD_CACHE_TTL, max_entries=UPLOAD_CACHE_MAX_ENTRIES, show_spinner=False)
+def get_top_artists(key, _df, n=10):
     """Get top n artists with their stats"""
-    return df.groupby('master_metadata_album_artist_name').agg({
-        'minutes_played': 'sum',
-        'master_metadata_track_name': 'nunique'
-    }).sort_values('minutes_played', ascending=False).head(n)
+    top_minutes = _df.groupby('master_metadata_album_artist_name', observed=True)['minutes_played'].sum().nlargest(n)
+    
+    # Count unique songs only for the top artists, the slow part of the aggregation
+    top_plays = _df[_df['master_metadata_album_artist_name'].isin(top_minutes.index)]
+    unique_songs = top_plays.groupby('master_metadata_album_artist_name', observed=True)['master_metadata_track_name'].nunique()
+    
+    return top_minutes.to_frame().assign(master_metadata_track_name=unique_songs.reindex(top_minutes.index))
 
-def get_top_songs(df, n=10):
+@st.cache_data(ttl=UPLOAD_CACHE_TTL, max_entries=UPLOAD_CACHE_MAX_ENTRIES, show_spinner=False)
+def get_top_songs(key, _df, n=10):
     """Get top n songs with their stats"""
-    return df.groupby(['master_metadata_track_name', 'master_metadata_album_artist_name', 'spotify_track_uri']).agg({
+    return _df.groupby(['master_metadata_track_name', 'master_metadata_album_artist_name', 'spotify_track_uri'], observed=True).agg({
         'minutes_played': 'sum',
         'ts': 'count'
     }).reset_index().sort_values('minutes_played', ascending=False).head(n)
 
-def get_spotify_image(sp, name, type='artist'):
-    """Get Spotify image URL for artist or track"""
+# The cached Spotify lookups below let lookup errors propagate, so st.cache_data and the disk
+# cache only ever keep real answers; the public wrappers turn errors into "not found"
+@st.cache_data(ttl=3600, show_spinner=False)
+@disk_cached('artist_info')
+def _search_spotify_artist(_sp, name):
+    """Search Spotify for an artist's ID and image URL"""
+    results = spotify_request(_sp.search, q=name, type='artist', limit=1)
+    if not results['artists']['items']:
+        return None, None
+    item = results['artists']['items'][0]
+    return item['id'], item['images'][0]['url'] if item['images'] else None
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _fetch_track_images(_sp, uris):
+    """Fetch album image URLs for several tracks, 50 tracks per request"""
+    images = [None] * len(uris)
+    for start in range(0, len(uris), SPOTIFY_BATCH_SIZE):
+        tracks = spotify_request(_sp.tracks, uris[start:start + SPOTIFY_BATCH_SIZE])['tracks']
+        for i, track in enumerate(tracks, start):
+            if track and track['album']['images']:
+                images[i] = track['album']['images'][0]['url']
+    return images
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _fetch_artists_from_tracks(_sp, uris, names):
+    """Fetch (ID, image URL) pairs for the named artist on each of several tracks, 50 per request"""
+    artist_ids = [None] * len(uris)
+    images = {}
+    known = [(i, uri) for i, uri in enumerate(uris) if uri]
+    for start in range(0, len(known), SPOTIFY_BATCH_SIZE):
+        batch = known[start:start + SPOTIFY_BATCH_SIZE]
+        tracks = spotify_request(_sp.tracks, [uri for _, uri in batch])['tracks']
+        for (i, _), track in zip(batch, tracks):
+            # The artist needn't be listed first on a collaboration, so match by name; no
+            # match leaves the artist missing for the name search to resolve
+            if track:
+                artist_ids[i] = next((artist['id'] for artist in track['artists']
+                                      if artist['name'] == names[i]), None)
+    
+    ids = list(dict.fromkeys(artist_id for artist_id in artist_ids if artist_id))
+    for start in range(0, len(ids), SPOTIFY_BATCH_SIZE):
+        for artist in spotify_request(_sp.artists, ids[start:start + SPOTIFY_BATCH_SIZE])['artists']:
+            if artist and artist['images']:
+                images[artist['id']] = artist['images'][0]['url']
+    return [(artist_id, images.get(artist_id)) for artist_id in artist_ids]
+
+def get_spotify_artist_info(sp, name):
+    """Get Spotify ID and image URL for an artist from a single search"""
+    if pd.isna(name) or not name:
+        return None, None
     try:
-        results = sp.search(q=name, type=type, limit=1)
-        if type == 'artist':
-            return results['artists']['items'][0]['images'][0]['url'] if results['artists']['items'] else None
-        else:
-            return results['tracks']['items'][0]['album']['images'][0]['url'] if results['tracks']['items'] else None
-    except:
-        return None
+        return _search_spotify_artist(sp, name)
+    except SPOTIFY_LOOKUP_ERRORS:
+        return None, None
 
-def get_spotify_id(sp, name, type='artist'):
-    """Get Spotify ID for artist or track"""
+def get_spotify_track_images(sp, uris):
+    """Get album image URLs for several tracks"""
     try:
-        results = sp.search(q=name, type=type, limit=1)
-        if type == 'artist':
-            return results['artists']['items'][0]['id'] if results['artists']['items'] else None
-        else:
-            return results['tracks']['items'][0]['id'] if results['tracks']['items'] else None
-    except:
-        return None
+        return _fetch_track_images(sp, uris)
+    except SPOTIFY_LOOKUP_ERRORS:
+        return [None] * len(uris)
+
+def get_spotify_artists_from_tracks(sp, uris, names):
+    """Get (ID, image URL) pairs for the named artist on each of several tracks"""
+    try:
+        return _fetch_artists_from_tracks(sp, uris, names)
+    except SPOTIFY_LOOKUP_ERRORS:
+        return [(None, None)] * len(uris)
+
+def get_artist_track_uris(df, artists):
+    """Get one track URI per artist, so artists can be resolved through the batch tracks endpoint"""
+    tracks = df[df['master_metadata_album_artist_name'].isin(artists)].dropna(subset=['spotify_track_uri'])
+    first = tracks.groupby('master_metadata_album_artist_name', observed=True)['spotify_track_uri'].first()
+    return [first.get(artist) for artist in artists]
+
+def get_spotify_artists_info(sp, df, names):
+    """Get (ID, image URL) pairs for several artists, batched through their tracks, searching only the misses"""
+    names = list(names)
+    artists_info = get_spotify_artists_from_tracks(sp, get_artist_track_uris(df, names), names)
+    missing = [i for i, (artist_id, image) in enumerate(artists_info) if not (artist_id and image)]
+    
+    if missing:
+        with ThreadPoolExecutor(max_workers=SPOTIFY_MAX_WORKERS) as executor:
+            found = executor.map(lambda i: get_spotify_artist_info(sp, names[i]), missing)
+            for i, info in zip(missing, found):
+                artists_info[i] = info
+    
+    return artists_info
+
+def get_hourly_minutes(df):
+    """Minutes played in each hour of the day, as a length-24 array"""
+    return np.bincount(df['hour'], weights=df['minutes_played'], minlength=24)
+
+def get_feature_means(df):
+    """Average of each profile audio feature, computed once and kept in session state"""
+    if st.session_state.get('feature_means') is None:
+        with st.spinner("Generating audio features..."):
+            st.session_state.feature_means = audio_feature_means(df, PROFILE_FEATURES)
+    return st.session_state.feature_means
 
 # ---- Visualization Functions ----
-def create_daily_waveform(df):
-    df['date'] = pd.to_datetime(df['ts']).dt.date
-    daily_counts = df.groupby('date').size().reset_index()
-    daily_counts.columns = ['date', 'count']
-    daily_counts = daily_counts.sort_values('date')
-    daily_counts['date'] = pd.to_datetime(daily_counts['date'])
+@st.cache_data(ttl=UPLOAD_CACHE_TTL, max_entries=UPLOAD_CACHE_MAX_ENTRIES, show_spinner=False)
+def create_daily_waveform(key, _df):
+    daily = _df['date'].value_counts().sort_index()
+    daily.index = daily.index.tz_localize(None)
+    hover_format = '%B %d, %Y'
 
+    # Past a year of history single days are indistinguishable, so plot weekly totals instead
+    if len(daily) and (daily.index[-1] - daily.index[0]).days > WAVEFORM_DAILY_MAX_DAYS:
+        daily = daily.groupby(daily.index.to_period('W')).sum()
+        daily.index = daily.index.start_time
+        hover_format = 'Week of %B %d, %Y'
+
+    dates, counts = daily.index, daily.to_numpy()
+
+    # One bar per day spanning -count..count draws the mirrored waveform from a single trace
     fig = go.Figure()
     fig.add_trace(go.Bar(
-        x=daily_counts['date'],
-        y=daily_counts['count'],
+        x=dates,
+        y=counts * 2,
+        base=-counts,
         marker_color='#1DB954',
         width=1,
         hoverinfo='text',
-        text=[f"{date.strftime('%B %d, %Y')} Songs played: {count}" 
-              for date, count in zip(daily_counts['date'], daily_counts['count'])]
-    ))
-    
-    fig.add_trace(go.Bar(
-        x=daily_counts['date'],
-        y=-daily_counts['count'],
-        marker_color='#1DB954',
-        width=1,
-        showlegend=False,
-        hoverinfo='text',
+        # Fixed-width string array serializes faster than an object Index of Python strings
+        text=dates.strftime(hover_format).str.cat(counts.astype(str), sep=' Songs played: ').to_numpy(dtype=str)
     ))
     
     fig.update_layout(
@@ -127,16 +348,14 @@ def create_daily_waveform(df):
     
     return fig
 
-def create_listening_clock(df):
-    df['hour'] = df['ts'].dt.hour
-    hourly_stats = df.groupby('hour')['minutes_played'].sum().reset_index()
-    all_hours = pd.DataFrame({'hour': range(24)})
-    hourly_stats = all_hours.merge(hourly_stats, on='hour', how='left').fillna(0)
+@st.cache_data(ttl=UPLOAD_CACHE_TTL, max_entries=UPLOAD_CACHE_MAX_ENTRIES, show_spinner=False)
+def create_listening_clock(key, _df):
+    hourly_minutes = get_hourly_minutes(_df)
     
     fig = go.Figure()
     fig.add_trace(go.Barpolar(
-        r=hourly_stats['minutes_played'],
-        theta=hourly_stats['hour'] * 15,
+        r=hourly_minutes,
+        theta=np.arange(24) * 15,
         width=15,
         marker_color='#1DB954',
         opacity=0.8,
@@ -161,9 +380,12 @@ def create_listening_clock(df):
     
     return fig
 
-def create_top_artists_chart(df, sp):
-    top_artists = get_top_artists(df, 10).sort_values('minutes_played', ascending=True)
-    artist_images = [get_spotify_image(sp, artist) for artist in top_artists.index]
+# Spotify images are looked up by the caller and passed in, so a failed lookup is never
+# baked into a cached figure
+@st.cache_data(ttl=UPLOAD_CACHE_TTL, max_entries=UPLOAD_CACHE_MAX_ENTRIES, show_spinner=False)
+def create_top_artists_chart(key, _df, images_by_artist):
+    top_artists = get_top_artists(key, _df, 10).sort_values('minutes_played', ascending=True)
+    artist_images = [images_by_artist.get(artist) for artist in top_artists.index]
     
     fig = go.Figure()
     fig.add_trace(go.Bar(
@@ -200,9 +422,10 @@ def create_top_artists_chart(df, sp):
     
     return fig
 
-def create_top_songs_chart(df, sp):
-    top_songs = get_top_songs(df, 10).sort_values('minutes_played', ascending=True)
-    song_images = [get_spotify_image(sp, song, 'track') for song in top_songs['master_metadata_track_name']]
+@st.cache_data(ttl=UPLOAD_CACHE_TTL, max_entries=UPLOAD_CACHE_MAX_ENTRIES, show_spinner=False)
+def create_top_songs_chart(key, _df, images_by_uri):
+    top_songs = get_top_songs(key, _df, 10).sort_values('minutes_played', ascending=True)
+    song_images = [images_by_uri.get(uri) for uri in top_songs['spotify_track_uri']]
     
     fig = go.Figure()
     fig.add_trace(go.Bar(
@@ -239,20 +462,9 @@ def create_top_songs_chart(df, sp):
     
     return fig
 
-def create_features_radar(df):
-    features = ['danceability', 'energy', 'valence', 
-                'speechiness', 'acousticness', 'instrumentalness']
-    
-    avg_features = df[features].mean()
-    
-    colors = {
-        'danceability': '#FF6B6B',
-        'energy': '#4ECDFF',
-        'valence': '#FFD93D',
-        'speechiness': '#95E1D3',
-        'acousticness': '#F5aA7B',
-        'instrumentalness': '#FF8BBA'
-    }
+@st.cache_data(ttl=UPLOAD_CACHE_TTL, max_entries=UPLOAD_CACHE_MAX_ENTRIES, show_spinner=False)
+def create_features_radar(avg_features):
+    features = list(avg_features.index)
     
     fig = go.Figure()
     fig.add_trace(go.Scatterpolar(
@@ -264,16 +476,14 @@ def create_features_radar(df):
         name='Average',
     ))
     
-    for feature, value in zip(features, avg_features):
-        r_values = [value if f == feature else 0 for f in features]
-        rgb = tuple(int(colors[feature].lstrip("#")[i:i+2], 16) for i in (0, 2, 4))
-        
+    one_hot = np.eye(len(features))
+    for i, (feature, value) in enumerate(zip(features, avg_features)):
         fig.add_trace(go.Scatterpolar(
-            r=r_values,
+            r=one_hot[i] * value,
             theta=features,
             fill='toself',
-            fillcolor=f'rgba{rgb + (0.6,)}',
-            line=dict(color=colors[feature], width=2),
+            fillcolor=FEATURE_FILL[feature],
+            line=dict(color=FEATURE_COLORS[feature], width=2),
             name=feature.capitalize(),
             hovertemplate=feature.capitalize() + ": %{r:.2f}<extra></extra>"
         ))
@@ -302,8 +512,7 @@ def create_features_radar(df):
 
 # ---- Analysis Functions ----
 def analyze_listening_patterns(df):
-    df['hour'] = df['ts'].dt.hour
-    hourly_stats = df.groupby('hour')['minutes_played'].sum()
+    hourly_minutes = get_hourly_minutes(df)
     
     time_blocks = {
         'early_morning': (5, 8),
@@ -312,17 +521,17 @@ def analyze_listening_patterns(df):
         'late_night': (22, 5)
     }
     
-    total_minutes = hourly_stats.sum()
+    total_minutes = hourly_minutes.sum()
     block_percentages = {}
     
     for block, (start, end) in time_blocks.items():
         if start < end:
-            block_minutes = hourly_stats[start:end].sum()
+            block_minutes = hourly_minutes[start:end].sum()
         else:
-            block_minutes = hourly_stats[start:].sum() + hourly_stats[:end].sum()
+            block_minutes = hourly_minutes[start:].sum() + hourly_minutes[:end].sum()
         block_percentages[block] = (block_minutes / total_minutes) * 100
 
-    peak_hour = hourly_stats.idxmax()
+    peak_hour = int(hourly_minutes.argmax())
     insights = [f"🎧 Your music hits different at {peak_hour:02d}:00!"]
     
     pattern_insights = {
@@ -354,14 +563,7 @@ def analyze_listening_patterns(df):
     return insights, block_percentages
 
 def analyze_music_profile(df):
-    features = {
-        'danceability': df['danceability'].mean(),
-        'energy': df['energy'].mean(),
-        'valence': df['valence'].mean(),
-        'speechiness': df['speechiness'].mean(),
-        'acousticness': df['acousticness'].mean(),
-        'instrumentalness': df['instrumentalness'].mean()
-    }
+    features = get_feature_means(df).to_dict()
     
     if features['energy'] > 0.7 and features['danceability'] > 0.6:
         personality = "Party Starter 🎉"
@@ -507,14 +709,25 @@ def display_music_profile_analysis(df):
                     </div>
                 """, unsafe_allow_html=True)
 
-def display_top_artist_and_song_section(df, sp):
+def display_top_artist_and_song_section(key, df, sp):
     """Display top artist and song section with images and stats"""
-    top_artists = get_top_artists(df, 1).reset_index().iloc[0]
-    top_songs = get_top_songs(df, 1).iloc[0]
-    
-    # Get images
-    artist_img = get_spotify_image(sp, top_artists['master_metadata_album_artist_name'])
-    song_img = get_spotify_image(sp, top_songs['master_metadata_track_name'], 'track')
+    # The two aggregations are independent, so run them side by side. Both lists are
+    # sorted, and their top 10 is what the charts below reuse from the cache
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        artists_future = executor.submit(get_top_artists, key, df, 10)
+        songs_future = executor.submit(get_top_songs, key, df, 10)
+    top10_artists = artists_future.result()
+    top10_songs = songs_future.result()
+    top_artists = top10_artists.reset_index().iloc[0]
+    top_songs = top10_songs.iloc[0]
+    
+    # Get images once for the cards and the charts
+    artist_images = {artist: image for artist, (_, image)
+                     in zip(top10_artists.index, get_spotify_artists_info(sp, df, top10_artists.index))}
+    song_uris = list(top10_songs['spotify_track_uri'])
+    song_images = dict(zip(song_uris, get_spotify_track_images(sp, song_uris)))
+    artist_img = artist_images[top_artists['master_metadata_album_artist_name']]
+    song_img = song_images[top_songs['spotify_track_uri']]
 
     col1, col2 = st.columns(2)
     
@@ -531,7 +744,7 @@ def display_top_artist_and_song_section(df, sp):
                 **Total Minutes**: {int(top_artists['minutes_played']):,}<br>
                 **Unique Songs**: {top_artists['master_metadata_track_name']}
             """, unsafe_allow_html=True)
-        st.plotly_chart(create_top_artists_chart(df, sp), use_container_width=True)
+        st.plotly_chart(create_top_artists_chart(key, df, artist_images), use_container_width=True)
 
     # Top Song Column
     with col2:
@@ -547,10 +760,11 @@ def display_top_artist_and_song_section(df, sp):
                 **Times Played**: {int(top_songs['ts'])}<br>
                 **Minutes**: {int(top_songs['minutes_played'])}
             """, unsafe_allow_html=True)
-        st.plotly_chart(create_top_songs_chart(df, sp), use_container_width=True)
+        st.plotly_chart(create_top_songs_chart(key, df, song_images), use_container_width=True)
 
-def display_top_artists_player(df, sp):
-    top_artists = get_top_artists(df, 8)
+@st.fragment
+def display_top_artists_player(key, df, sp):
+    top_artists = get_top_artists(key, df, 8)
     
     if 'selected_artist_id' not in st.session_state:
         st.session_state.selected_artist_id = None
@@ -568,15 +782,13 @@ def display_top_artists_player(df, sp):
         </style>
     """, unsafe_allow_html=True)
     
-    for idx, (artist, _) in enumerate(top_artists.iterrows()):
+    artists_info = get_spotify_artists_info(sp, df, top_artists.index)
+    
+    for idx, (artist_id, artist_image) in enumerate(artists_info):
         with cols[idx]:
-            artist_id = get_spotify_id(sp, artist)
-            artist_image = get_spotify_image(sp, artist)
-            
             if artist_image and artist_id:
                 if st.button("▶", key=f"artist_{artist_id}", use_container_width=True):
                     st.session_state.selected_artist_id = artist_id
-                    st.rerun()
                 st.image(artist_image, width=100, use_container_width=True)
     
     if st.session_state.selected_artist_id:
@@ -612,9 +824,10 @@ def main():
 
     add_vertical_space(2)
 
-    total_minutes = df['minutes_played'].sum()
-    total_songs = len(df)
-    total_artists = df['master_metadata_album_artist_name'].nunique()
+    totals = st.session_state.totals
+    total_minutes = totals['minutes']
+    total_songs = totals['songs']
+    total_artists = totals['artists']
     
     # Display metrics
     cols = st.columns(3)
@@ -633,7 +846,7 @@ def main():
 
     add_vertical_space(2)
 
-    st.plotly_chart(create_daily_waveform(df), use_container_width=True)
+    st.plotly_chart(create_daily_waveform(history_key, df), use_container_width=True)
     st.markdown(f"""
                 <div class='sub'>ⓘ <i>Total songs you played each day</i></div>
             """, unsafe_allow_html=True)
@@ -643,7 +856,7 @@ def main():
     st.header("⏰ Your Listening Clock")
     col1, col2 = st.columns(2)
     with col1:
-        st.plotly_chart(create_listening_clock(df), use_container_width=True)
+        st.plotly_chart(create_listening_clock(history_key, df), use_container_width=True)
     with col2:
         display_listening_analysis(df)
 
@@ -651,8 +864,8 @@ def main():
 
     # Top Music Section
     st.header("📈 Your Top Music")
-    display_top_artist_and_song_section(df, sp)
-    display_top_artists_player(df, sp)
+    display_top_artist_and_song_section(history_key, df, sp)
+    display_top_artists_player(history_key, df, sp)
 
     add_vertical_space(2)
 
@@ -661,7 +874,7 @@ def main():
         st.header("👔 Your Music Profile")
         col1, col2 = st.columns([2, 1])
         with col1:
-            st.plotly_chart(create_features_radar(df), use_container_width=True)
+            st.plotly_chart(create_features_radar(get_feature_means(df)), use_container_width=True)
         with col2:
             st.markdown("#### What This Means❓")
             st.markdown("""
@@ -680,6 +893,7 @@ def main():
     if st.button("🔁 Use different data", use_container_width=True):
         st.session_state.processed_data = None
         st.session_state.audio_features_added = None
+        reset_audio_features()
         st.switch_page("pages/upload.py")
 
 if __name__ == "__main__":